@@ -1,10 +1,17 @@
+# Patch blocking I/O first so gevent workers can multiplex the outbound HTTP fan-out
+from gevent import monkey
+monkey.patch_all()
+
 from flask import Flask, render_template, jsonify
 import os
 import sqlite3
 import requests
 import json
 import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
+from requests.adapters import HTTPAdapter
 
 app = Flask(__name__)
 
@@ -17,15 +24,41 @@ GATEWAY_URL = f"http://pqc-gateway:{os.environ.get('GATEWAY_PORT', 2525)}"
 # Database path
 DB_PATH = '/app/dashboard.db'
 
+# Shared HTTP session so connections to the backend services are reused across refreshes
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+session.mount('http://', _adapter)
+session.mount('https://', _adapter)
+
+# Worker pool for probing service health endpoints concurrently
+health_executor = ThreadPoolExecutor(max_workers=3)
+
+# Short-lived cache for /api/stats so concurrent dashboard polls share one refresh
+_CACHE_TTL = 2.0
+_stats_cache = {'value': None, 'ts': 0.0}
+_stats_lock = threading.Lock()
+
+# The database is initialized on first use rather than at import
+_db_initialized = False
+_db_init_lock = threading.Lock()
+
+# Database connection with WAL and relaxed fsync so polling never blocks on the journal
+def get_db_connection():
+    conn = sqlite3.connect(DB_PATH)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA busy_timeout=5000')
+    return conn
+
 # Initialize database
 def init_db():
-    conn = sqlite3.connect(DB_PATH)
+    conn = get_db_connection()
     cursor = conn.cursor()
     
-    # Create tables if they don't exist
+    # Create tables if they don't exist (stats holds a single row of last-known counters)
     cursor.execute('''
     CREATE TABLE IF NOT EXISTS stats (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        id INTEGER PRIMARY KEY CHECK (id = 1),
         emails_sent INTEGER DEFAULT 0,
         pdfs_signed INTEGER DEFAULT 0,
         receipts_generated INTEGER DEFAULT 0,
@@ -33,61 +66,60 @@ def init_db():
     )
     ''')
     
-    # Initialize with default values if empty
-    cursor.execute('SELECT COUNT(*) FROM stats')
-    if cursor.fetchone()[0] == 0:
-        cursor.execute('INSERT INTO stats (emails_sent, pdfs_signed, receipts_generated) VALUES (0, 0, 0)')
+    # Collapse any rows left over from the old append-only layout into row 1
+    cursor.execute('SELECT emails_sent, pdfs_signed, receipts_generated FROM stats ORDER BY id DESC LIMIT 1')
+    latest = cursor.fetchone() or (0, 0, 0)
+    cursor.execute('DELETE FROM stats WHERE id != 1')
+    cursor.execute(
+        'INSERT OR REPLACE INTO stats (id, emails_sent, pdfs_signed, receipts_generated) VALUES (1, ?, ?, ?)',
+        latest
+    )
     
     conn.commit()
     conn.close()
 
+def ensure_db():
+    global _db_initialized
+    if _db_initialized:
+        return
+    with _db_init_lock:
+        if not _db_initialized:
+            init_db()
+            _db_initialized = True
+
 # Update stats by checking services
 def update_stats():
     try:
-        conn = sqlite3.connect(DB_PATH)
+        ensure_db()
+        conn = get_db_connection()
         cursor = conn.cursor()
         
         # Get current stats
-        cursor.execute('SELECT emails_sent, pdfs_signed, receipts_generated FROM stats ORDER BY id DESC LIMIT 1')
+        cursor.execute('SELECT emails_sent, pdfs_signed, receipts_generated FROM stats WHERE id = 1')
         current_stats = cursor.fetchone()
         
-        # Try to get receipt count from receipts service
-        receipts_count = current_stats[2]  # Default to current value
-        try:
-            response = requests.get(f"{RECEIPTS_URL}/receipts?limit=1000", timeout=2)
-            if response.status_code == 200:
-                receipts_data = response.json()
-                receipts_count = len(receipts_data)
-        except Exception as e:
-            print(f"Error fetching receipts: {e}")
-        
-        # Count PDFs signed (based on receipts with type 'pdf')
-        pdfs_signed = current_stats[1]  # Default to current value
+        # Ask the receipts service for aggregate counts instead of fetching rows
+        emails_sent, pdfs_signed, receipts_count = current_stats
         try:
-            response = requests.get(f"{RECEIPTS_URL}/receipts?limit=1000", timeout=2)
+            response = session.get(f"{RECEIPTS_URL}/receipts/counts", timeout=2)
             if response.status_code == 200:
-                receipts_data = response.json()
-                pdfs_signed = sum(1 for receipt in receipts_data if receipt.get('type') == 'pdf')
+                counts = response.json()
+                by_type = counts.get('by_type', {})
+                emails_sent = by_type.get('email', 0)
+                pdfs_signed = by_type.get('pdf', 0)
+                receipts_count = counts.get('total', 0)
         except Exception as e:
-            print(f"Error counting signed PDFs: {e}")
+            print(f"Error fetching receipt counts: {e}")
         
-        # Count emails sent (based on receipts with type 'email')
-        emails_sent = current_stats[0]  # Default to current value
-        try:
-            response = requests.get(f"{RECEIPTS_URL}/receipts?limit=1000", timeout=2)
-            if response.status_code == 200:
-                receipts_data = response.json()
-                emails_sent = sum(1 for receipt in receipts_data if receipt.get('type') == 'email')
-        except Exception as e:
-            print(f"Error counting sent emails: {e}")
+        # Only touch the stats row when the counters actually changed
+        if (emails_sent, pdfs_signed, receipts_count) != tuple(current_stats):
+            cursor.execute(
+                'UPDATE stats SET emails_sent = ?, pdfs_signed = ?, receipts_generated = ?, '
+                'timestamp = CURRENT_TIMESTAMP WHERE id = 1',
+                (emails_sent, pdfs_signed, receipts_count)
+            )
+            conn.commit()
         
-        # Insert new stats record
-        cursor.execute(
-            'INSERT INTO stats (emails_sent, pdfs_signed, receipts_generated) VALUES (?, ?, ?)',
-            (emails_sent, pdfs_signed, receipts_count)
-        )
-        
-        conn.commit()
         conn.close()
         return emails_sent, pdfs_signed, receipts_count
     except Exception as e:
@@ -102,11 +134,17 @@ def check_services():
         'receipts': {'url': f"{RECEIPTS_URL}/health", 'status': 'down'}
     }
     
-    for service_name, service_info in services.items():
+    # Probe all services at once so the total wait is the slowest probe, not the sum
+    futures = {
+        health_executor.submit(session.get, service_info['url'], timeout=2): service_name
+        for service_name, service_info in services.items()
+    }
+    done, _ = wait(futures, timeout=2.5)
+    
+    for future in done:
         try:
-            response = requests.get(service_info['url'], timeout=2)
-            if response.status_code == 200:
-                services[service_name]['status'] = 'up'
+            if future.result().status_code == 200:
+                services[futures[future]]['status'] = 'up'
         except Exception:
             pass
     
@@ -119,16 +157,23 @@ def index():
 
 @app.route('/api/stats')
 def get_stats():
-    emails_sent, pdfs_signed, receipts_generated = update_stats()
-    services = check_services()
+    with _stats_lock:
+        if _stats_cache['value'] is None or time.monotonic() - _stats_cache['ts'] >= _CACHE_TTL:
+            emails_sent, pdfs_signed, receipts_generated = update_stats()
+            services = check_services()
+            
+            _stats_cache['value'] = {
+                'emails_sent': emails_sent,
+                'pdfs_signed': pdfs_signed,
+                'receipts_generated': receipts_generated,
+                'services': services,
+                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            _stats_cache['ts'] = time.monotonic()
+        
+        stats = _stats_cache['value']
     
-    return jsonify({
-        'emails_sent': emails_sent,
-        'pdfs_signed': pdfs_signed,
-        'receipts_generated': receipts_generated,
-        'services': services,
-        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-    })
+    return jsonify(stats)
 
 @app.route('/api/health')
 def health():
@@ -136,7 +181,7 @@ def health():
 
 if __name__ == '__main__':
     # Initialize the database
-    init_db()
+    ensure_db()
     
-    # Start the Flask app
+    # Start the Flask development server; production runs under gunicorn
     app.run(host='0.0.0.0', port=int(os.environ.get('DASHBOARD_PORT', 8080)))
\ No newline at end of file
@@ -0,0 +1,21 @@
+import json
+
+class HealthInterceptor:
+    """ASGI wrapper that answers health probes before FastAPI routing runs"""
+    
+    def __init__(self, app, paths=("/health",), body=None):
+        self.app = app
+        self.paths = frozenset(paths)
+        self.body = json.dumps(body or {"status": "healthy"}).encode()
+        self.headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(self.body)).encode())
+        ]
+    
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.paths:
+            await send({"type": "http.response.start", "status": 200, "headers": self.headers})
+            await send({"type": "http.response.body", "body": self.body})
+            return
+        
+        await self.app(scope, receive, send)
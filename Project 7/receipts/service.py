@@ -1,22 +1,32 @@
 from fastapi import FastAPI, HTTPException, Request, Depends
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import uvicorn
+from health_interceptor import HealthInterceptor
 import sqlite3
+import aiosqlite
 import os
 import json
+import orjson
 import hashlib
+import base64
 import time
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 from typing import List, Optional
+from urllib.parse import quote
 import logging
 import io
+import asyncio
+import textwrap
 import reportlab.pdfgen.canvas
 from reportlab.lib.pagesizes import letter
 
+LETTER_WIDTH, LETTER_HEIGHT = letter
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,66 +44,69 @@ app = FastAPI(title="Immutable Receipts Service", description="Quantum-Safe Rece
 # Configuration
 DATABASE_PATH = os.environ.get("DATABASE_PATH", "/app/data/receipts.db")
 DATABASE_DIR = os.path.dirname(DATABASE_PATH)
+MAX_CHAIN_DEPTH = int(os.environ.get("MAX_CHAIN_DEPTH", 10000))
+CERTIFICATE_CACHE_SIZE = 1024
+
+# SQL statements, defined once so the connection's statement cache reuses them
+RECEIPT_COLUMNS = "id, document_hash, signature, timestamp, type, previous_hash, metadata"
+SQL_INSERT_RECEIPT = f"INSERT INTO receipts ({RECEIPT_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)"
+SQL_GET_RECEIPT = f"SELECT {RECEIPT_COLUMNS} FROM receipts WHERE id = ?"
+# rowid breaks timestamp ties by insertion order (ids are random UUIDs)
+SQL_CHAIN_HEAD = "SELECT document_hash, timestamp FROM receipts ORDER BY timestamp DESC, rowid DESC LIMIT 1"
+SQL_COUNT_RECEIPTS = "SELECT COUNT(*) FROM receipts"
+SQL_COUNT_BY_TYPE = "SELECT type, COUNT(*) FROM receipts GROUP BY type"
+SQL_LIST_RECEIPTS = f"SELECT {RECEIPT_COLUMNS} FROM receipts ORDER BY timestamp DESC, id DESC LIMIT ?"
+SQL_LIST_RECEIPTS_AFTER = (
+    f"SELECT {RECEIPT_COLUMNS} FROM receipts WHERE (timestamp, id) < (?, ?) "
+    "ORDER BY timestamp DESC, id DESC LIMIT ?"
+)
+# Walk the chain: each step links to the latest earlier receipt whose
+# document hash matches the current receipt's previous hash
+SQL_VERIFY_CHAIN = """
+WITH RECURSIVE chain(id, previous_hash, timestamp, depth) AS (
+    SELECT id, previous_hash, timestamp, 0 FROM receipts WHERE id = ?
+    UNION ALL
+    SELECT r.id, r.previous_hash, r.timestamp, c.depth + 1
+    FROM chain c
+    JOIN receipts r ON r.id = (
+        SELECT p.id FROM receipts p
+        WHERE p.document_hash = c.previous_hash AND p.timestamp < c.timestamp
+        ORDER BY p.timestamp DESC, p.rowid DESC
+        LIMIT 1
+    )
+    WHERE c.depth < ?
+)
+SELECT id, previous_hash, depth FROM chain ORDER BY depth DESC LIMIT 1
+"""
 
 # Create database directory if it doesn't exist
 os.makedirs(DATABASE_DIR, exist_ok=True)
 
-# Setup templates
-templates = Jinja2Templates(directory="templates")
-
-# Create templates directory and basic template file
-os.makedirs("templates", exist_ok=True)
-with open("templates/receipt.html", "w") as f:
-    f.write("""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <title>Receipt #{{ receipt.id }}</title>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 40px; }
-            .receipt { border: 1px solid #ccc; padding: 20px; max-width: 800px; margin: 0 auto; }
-            .header { text-align: center; border-bottom: 1px solid #eee; padding-bottom: 10px; }
-            .content { margin: 20px 0; }
-            .footer { border-top: 1px solid #eee; padding-top: 10px; font-size: 0.8em; }
-            .signature { font-family: monospace; word-break: break-all; }
-        </style>
-    </head>
-    <body>
-        <div class="receipt">
-            <div class="header">
-                <h1>Quantum-Safe Receipt</h1>
-                <h2>ID: {{ receipt.id }}</h2>
-            </div>
-            <div class="content">
-                <p><strong>Type:</strong> {{ receipt.type }}</p>
-                <p><strong>Timestamp:</strong> {{ receipt.timestamp }}</p>
-                <p><strong>Document Hash:</strong> {{ receipt.document_hash }}</p>
-                <p><strong>Previous Hash:</strong> {{ receipt.previous_hash }}</p>
-                <p><strong>Signature Algorithm:</strong> ML-DSA (Dilithium)</p>
-                <p><strong>Signature:</strong></p>
-                <p class="signature">{{ receipt.signature }}</p>
-            </div>
-            <div class="footer">
-                <p>This receipt is part of an immutable hash-chain. Verify at: /receipts/verify/{{ receipt.id }}</p>
-                <p>Export Section 65B Certificate: <a href="/receipts/{{ receipt.id }}/certificate">Download</a></p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """)
+# Setup templates (shipped alongside this module)
+templates = Jinja2Templates(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates"))
+
+
+# Shared aiosqlite connection, opened on startup
+db: Optional[aiosqlite.Connection] = None
+
+# Serializes "read chain head, then insert" so concurrent writers cannot fork the chain
+write_lock = asyncio.Lock()
 
 # Database initialization
-def get_db_connection():
-    conn = sqlite3.connect(DATABASE_PATH)
-    conn.row_factory = sqlite3.Row
+async def get_db_connection() -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(DATABASE_PATH)
+    # WAL lets readers proceed during writes; NORMAL sync is durable enough under WAL
+    await conn.execute("PRAGMA journal_mode=WAL")
+    await conn.execute("PRAGMA synchronous=NORMAL")
+    await conn.execute("PRAGMA busy_timeout=5000")
+    await conn.execute("PRAGMA temp_store=MEMORY")
+    await conn.execute("PRAGMA cache_size=-20000")
+    conn.row_factory = aiosqlite.Row
     return conn
 
-def init_db():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+async def init_db():
     # Create receipts table
-    cursor.execute('''
+    await db.execute('''
     CREATE TABLE IF NOT EXISTS receipts (
         id TEXT PRIMARY KEY,
         document_hash TEXT NOT NULL,
@@ -105,13 +118,25 @@ def init_db():
     )
     ''')
     
-    conn.commit()
-    conn.close()
+    # Indexes for timestamp ordering, hash-chain lookups and per-type counts
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_receipts_timestamp_id ON receipts(timestamp DESC, id DESC)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_receipts_doc_hash ON receipts(document_hash)")
+    await db.execute("CREATE INDEX IF NOT EXISTS idx_receipts_type ON receipts(type)")
+    
+    await db.commit()
     
     logger.info(f"Database initialized at {DATABASE_PATH}")
 
-# Initialize database on startup
-init_db()
+# Open the database and initialize it on startup
+@app.on_event("startup")
+async def open_db():
+    global db
+    db = await get_db_connection()
+    await init_db()
+
+@app.on_event("shutdown")
+async def close_db():
+    await db.close()
 
 # Models
 class ReceiptCreate(BaseModel):
@@ -131,17 +156,44 @@ class Receipt(BaseModel):
     previous_hash: Optional[str] = None
     metadata: Optional[dict] = None
 
+# Metadata (de)serialization
+def encode_metadata(metadata: Optional[dict]) -> Optional[str]:
+    """Serialize receipt metadata for storage"""
+    if not metadata:
+        return None
+    try:
+        return orjson.dumps(metadata).decode()
+    except orjson.JSONEncodeError:
+        # orjson rejects integers wider than 64 bits; the stdlib encoder does not
+        return json.dumps(metadata)
+
+def decode_metadata(metadata: str) -> dict:
+    """Parse stored receipt metadata"""
+    # Text in the stdlib's spaced format may carry integers wider than 64 bits,
+    # which orjson would silently turn into floats
+    if '": ' in metadata:
+        return json.loads(metadata)
+    return orjson.loads(metadata)
+
+class ReceiptJSONResponse(ORJSONResponse):
+    """ORJSONResponse that falls back to the stdlib encoder for values orjson rejects"""
+    
+    def render(self, content) -> bytes:
+        try:
+            return super().render(content)
+        except orjson.JSONEncodeError:
+            return JSONResponse.render(self, content)
+
 # Hash-chain functions
-def get_latest_receipt_hash():
+async def get_chain_head():
+    """Get the (document_hash, timestamp) of the latest receipt in the chain"""
+    # Get the latest receipt by timestamp, most recently inserted on ties
+    async with db.execute(SQL_CHAIN_HEAD) as cursor:
+        return await cursor.fetchone()
+
+async def get_latest_receipt_hash():
     """Get the hash of the latest receipt in the chain"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get the latest receipt by timestamp
-    cursor.execute("SELECT document_hash FROM receipts ORDER BY timestamp DESC LIMIT 1")
-    result = cursor.fetchone()
-    
-    conn.close()
+    result = await get_chain_head()
     
     if result:
         return result[0]
@@ -161,72 +213,128 @@ async def root():
 @app.post("/receipts", status_code=201, response_model=Receipt)
 async def create_receipt(receipt: ReceiptCreate):
     """Create a new receipt and add it to the hash-chain"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     # Generate ID if not provided
     if not receipt.id:
         receipt.id = str(uuid.uuid4())
     
-    # Get the previous hash from the latest receipt
-    previous_hash = get_latest_receipt_hash()
-    
-    # Create the receipt with the previous hash
-    receipt_data = {
-        "id": receipt.id,
-        "document_hash": receipt.document_hash,
-        "signature": receipt.signature,
-        "timestamp": receipt.timestamp,
-        "type": receipt.type,
-        "previous_hash": previous_hash,
-        "metadata": json.dumps(receipt.metadata) if receipt.metadata else None
-    }
-    
-    try:
-        cursor.execute(
-            "INSERT INTO receipts (id, document_hash, signature, timestamp, type, previous_hash, metadata) "
-            "VALUES (?, ?, ?, ?, ?, ?, ?)",
-            (
-                receipt_data["id"],
-                receipt_data["document_hash"],
-                receipt_data["signature"],
-                receipt_data["timestamp"],
-                receipt_data["type"],
-                receipt_data["previous_hash"],
-                receipt_data["metadata"]
-            )
-        )
-        conn.commit()
+    async with write_lock:
+        # Get the previous hash from the latest receipt
+        previous_hash = await get_latest_receipt_hash()
         
-        # Log the transaction
-        logger.info(f"Receipt created: ID={receipt_data['id']}, Type={receipt_data['type']}, Hash={receipt_data['document_hash'][:10]}...")
-    except sqlite3.IntegrityError:
-        logger.error(f"Failed to create receipt: ID={receipt.id} already exists")
-        conn.close()
-        raise HTTPException(status_code=400, detail=f"Receipt with ID {receipt.id} already exists")
-    except Exception as e:
-        logger.error(f"Error creating receipt: {str(e)}")
-        conn.close()
-        raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
-    finally:
-        conn.close()
-    
-    # Convert metadata back to dict for response
-    if receipt_data["metadata"]:
-        receipt_data["metadata"] = json.loads(receipt_data["metadata"])
+        # Create the receipt with the previous hash
+        receipt_data = {
+            "id": receipt.id,
+            "document_hash": receipt.document_hash,
+            "signature": receipt.signature,
+            "timestamp": receipt.timestamp,
+            "type": receipt.type,
+            "previous_hash": previous_hash,
+            "metadata": receipt.metadata or None
+        }
+        
+        try:
+            await db.execute(
+                SQL_INSERT_RECEIPT,
+                (
+                    receipt_data["id"],
+                    receipt_data["document_hash"],
+                    receipt_data["signature"],
+                    receipt_data["timestamp"],
+                    receipt_data["type"],
+                    receipt_data["previous_hash"],
+                    encode_metadata(receipt_data["metadata"])
+                )
+            )
+            await db.commit()
+            
+            # Log the transaction
+            logger.info(f"Receipt created: ID={receipt_data['id']}, Type={receipt_data['type']}, Hash={receipt_data['document_hash'][:10]}...")
+        except sqlite3.IntegrityError:
+            await db.rollback()
+            logger.error(f"Failed to create receipt: ID={receipt.id} already exists")
+            raise HTTPException(status_code=400, detail=f"Receipt with ID {receipt.id} already exists")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error creating receipt: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
     
     return receipt_data
 
+@app.post("/receipts/bulk", status_code=201, response_model=List[Receipt])
+async def create_receipts_bulk(receipts: List[ReceiptCreate]):
+    """Create several receipts in a single transaction, chaining them in order"""
+    # Verification links each receipt to a strictly earlier one, so the batch must be ordered
+    for earlier, later in zip(receipts, receipts[1:]):
+        if later.timestamp <= earlier.timestamp:
+            raise HTTPException(status_code=400, detail="Receipt timestamps must be strictly increasing within a batch")
+    
+    async with write_lock:
+        # Fetch the chain head once, then link each new receipt to the one before it
+        head = await get_chain_head()
+        previous_hash = head["document_hash"] if head else None
+        
+        if head and receipts and receipts[0].timestamp <= head["timestamp"]:
+            raise HTTPException(status_code=400, detail="Receipt timestamps must be later than the latest receipt")
+        
+        created = []
+        for receipt in receipts:
+            created.append({
+                "id": receipt.id or str(uuid.uuid4()),
+                "document_hash": receipt.document_hash,
+                "signature": receipt.signature,
+                "timestamp": receipt.timestamp,
+                "type": receipt.type,
+                "previous_hash": previous_hash,
+                "metadata": receipt.metadata
+            })
+            previous_hash = receipt.document_hash
+        
+        try:
+            await db.executemany(
+                SQL_INSERT_RECEIPT,
+                [
+                    (
+                        r["id"],
+                        r["document_hash"],
+                        r["signature"],
+                        r["timestamp"],
+                        r["type"],
+                        r["previous_hash"],
+                        encode_metadata(r["metadata"])
+                    )
+                    for r in created
+                ]
+            )
+            await db.commit()
+            
+            logger.info(f"Bulk receipts created: count={len(created)}")
+        except sqlite3.IntegrityError:
+            await db.rollback()
+            logger.error("Failed to create bulk receipts: one or more receipt IDs already exist")
+            raise HTTPException(status_code=400, detail="One or more receipt IDs already exist")
+        except Exception as e:
+            await db.rollback()
+            logger.error(f"Error creating bulk receipts: {str(e)}")
+            raise HTTPException(status_code=500, detail=f"Internal server error: {str(e)}")
+    
+    return created
+
+@app.get("/receipts/counts")
+async def count_receipts():
+    """Count receipts in total and per type"""
+    async with db.execute(SQL_COUNT_BY_TYPE) as cursor:
+        by_type = {row[0]: row[1] for row in await cursor.fetchall()}
+    
+    return {
+        "total": sum(by_type.values()),
+        "by_type": by_type
+    }
+
 @app.get("/receipts/{receipt_id}", response_model=Receipt)
 async def get_receipt(receipt_id: str, request: Request):
     """Get a receipt by ID"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute("SELECT * FROM receipts WHERE id = ?", (receipt_id,))
-    result = cursor.fetchone()
-    
-    conn.close()
+    async with db.execute(SQL_GET_RECEIPT, (receipt_id,)) as cursor:
+        result = await cursor.fetchone()
     
     if not result:
         logger.warning(f"Receipt access attempt failed: ID={receipt_id} not found")
@@ -239,7 +347,7 @@ async def get_receipt(receipt_id: str, request: Request):
     
     # Parse metadata JSON if present
     if receipt["metadata"]:
-        receipt["metadata"] = json.loads(receipt["metadata"])
+        receipt["metadata"] = decode_metadata(receipt["metadata"])
     
     # Return HTML if requested in browser
     accept_header = request.headers.get("accept", "")
@@ -251,112 +359,111 @@ async def get_receipt(receipt_id: str, request: Request):
     
     return receipt
 
-@app.get("/receipts")
-async def list_receipts(limit: int = 10, offset: int = 0):
-    """List receipts with pagination"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
+def encode_cursor(timestamp: str, receipt_id: str) -> str:
+    """Encode a (timestamp, id) position as an opaque pagination cursor"""
+    return base64.urlsafe_b64encode(orjson.dumps([timestamp, receipt_id])).decode()
+
+def decode_cursor(cursor: str) -> tuple[str, str]:
+    """Decode a pagination cursor back into its (timestamp, id) position"""
+    try:
+        timestamp, receipt_id = orjson.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return str(timestamp), str(receipt_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+@app.get("/receipts", response_class=ReceiptJSONResponse)
+async def list_receipts(limit: int = 10, cursor: Optional[str] = None):
+    """List receipts newest first using keyset pagination"""
     # Get total count
-    cursor.execute("SELECT COUNT(*) FROM receipts")
-    total = cursor.fetchone()[0]
+    async with db.execute(SQL_COUNT_RECEIPTS) as db_cursor:
+        total = (await db_cursor.fetchone())[0]
     
-    # Get paginated receipts
-    cursor.execute(
-        "SELECT * FROM receipts ORDER BY timestamp DESC LIMIT ? OFFSET ?",
-        (limit, offset)
-    )
-    results = cursor.fetchall()
+    # Seek past the last (timestamp, id) of the previous page instead of using OFFSET
+    if cursor:
+        last_timestamp, last_id = decode_cursor(cursor)
+        query = SQL_LIST_RECEIPTS_AFTER
+        params = (last_timestamp, last_id, limit)
+    else:
+        query = SQL_LIST_RECEIPTS
+        params = (limit,)
     
-    conn.close()
+    async with db.execute(query, params) as db_cursor:
+        results = await db_cursor.fetchall()
     
     # Convert to list of dicts
     receipts = []
     for row in results:
         receipt = dict(row)
         if receipt["metadata"]:
-            receipt["metadata"] = json.loads(receipt["metadata"])
+            receipt["metadata"] = decode_metadata(receipt["metadata"])
         receipts.append(receipt)
     
+    # Only hand out a cursor when the page was full and more rows may follow
+    next_cursor = None
+    if receipts and len(receipts) == limit:
+        next_cursor = encode_cursor(receipts[-1]["timestamp"], receipts[-1]["id"])
+    
     return {
         "total": total,
-        "offset": offset,
         "limit": limit,
+        "next_cursor": next_cursor,
         "receipts": receipts
     }
 
 @app.get("/receipts/verify/{receipt_id}")
 async def verify_receipt(receipt_id: str):
-    """Verify a receipt's integrity in the hash-chain"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get the receipt
-    cursor.execute("SELECT * FROM receipts WHERE id = ?", (receipt_id,))
-    result = cursor.fetchone()
-    
-    if not result:
+    """Verify a receipt's integrity by walking the hash-chain back to its start"""
+    # Walk the whole chain inside SQLite in a single query
+    async with db.execute(
+        SQL_VERIFY_CHAIN,
+        (receipt_id, MAX_CHAIN_DEPTH)
+    ) as cursor:
+        last_link = await cursor.fetchone()
+    
+    if not last_link:
         logger.warning(f"Receipt verification failed: ID={receipt_id} not found")
-        conn.close()
         raise HTTPException(status_code=404, detail=f"Receipt with ID {receipt_id} not found")
     
-    receipt = dict(result)
-    
-    # Verify the hash chain
-    if receipt["previous_hash"]:
-        cursor.execute(
-            "SELECT document_hash FROM receipts WHERE document_hash = ? AND timestamp < ?",
-            (receipt["previous_hash"], receipt["timestamp"])
-        )
-        previous_receipt = cursor.fetchone()
-        
-        if not previous_receipt:
-            logger.warning(f"Receipt verification failed: ID={receipt_id}, previous hash does not match any receipt")
-            conn.close()
-            return {"verified": False, "error": "Previous hash does not match any receipt"}
-    
-    conn.close()
+    # The walk stopped early if the last receipt reached still points at a previous hash
+    if last_link["previous_hash"] and last_link["depth"] < MAX_CHAIN_DEPTH:
+        logger.warning(f"Receipt verification failed: ID={receipt_id}, chain broken at ID={last_link['id']}")
+        return {
+            "verified": False,
+            "error": "Previous hash does not match any receipt",
+            "broken_at": last_link["id"]
+        }
     
-    logger.info(f"Receipt verified successfully: ID={receipt_id}")
-    return {"verified": True, "receipt_id": receipt_id}
+    logger.info(f"Receipt verified successfully: ID={receipt_id}, chain length={last_link['depth'] + 1}")
+    return {
+        "verified": True,
+        "receipt_id": receipt_id,
+        "chain_length": last_link["depth"] + 1,
+        "chain_complete": last_link["previous_hash"] is None
+    }
 
-@app.get("/receipts/{receipt_id}/certificate")
-async def generate_certificate(receipt_id: str):
-    """Generate a Section 65B Certificate for a receipt"""
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Get the receipt
-    cursor.execute("SELECT * FROM receipts WHERE id = ?", (receipt_id,))
-    result = cursor.fetchone()
-    
-    conn.close()
-    
-    if not result:
-        logger.warning(f"Certificate generation failed: Receipt ID={receipt_id} not found")
-        raise HTTPException(status_code=404, detail=f"Receipt with ID {receipt_id} not found")
-        
-    logger.info(f"Section 65B Certificate generated for receipt: ID={receipt_id}")
-    
-    receipt = dict(result)
-    if receipt["metadata"]:
-        receipt["metadata"] = json.loads(receipt["metadata"])
-    
-    # Generate a PDF certificate
+def content_disposition(filename: str) -> str:
+    """Build an attachment Content-Disposition header safe for any filename"""
+    # Same encoding as FileResponse: RFC 5987 filename* when the name is not plain ASCII
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
+
+def build_certificate_pdf(receipt: dict) -> bytes:
+    """Render a Section 65B Certificate PDF for a receipt"""
     buffer = io.BytesIO()
     c = reportlab.pdfgen.canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
     
     # Title
     c.setFont("Helvetica-Bold", 16)
-    c.drawCentredString(width/2, height - 50, "SECTION 65B CERTIFICATE")
+    c.drawCentredString(LETTER_WIDTH/2, LETTER_HEIGHT - 50, "SECTION 65B CERTIFICATE")
     c.setFont("Helvetica-Bold", 14)
-    c.drawCentredString(width/2, height - 70, "(Under Indian Evidence Act)")
+    c.drawCentredString(LETTER_WIDTH/2, LETTER_HEIGHT - 70, "(Under Indian Evidence Act)")
     
     # Content
     c.setFont("Helvetica", 12)
-    y = height - 120
-    c.drawString(50, y, f"Certificate ID: {receipt_id}")
+    y = LETTER_HEIGHT - 120
+    c.drawString(50, y, f"Certificate ID: {receipt['id']}")
     y -= 20
     c.drawString(50, y, f"Date: {datetime.now().strftime('%Y-%m-%d')}")
     y -= 40
@@ -377,10 +484,8 @@ async def generate_certificate(receipt_id: str):
     text_obj = c.beginText(50, y)
     text_obj.setFont("Helvetica", 12)
     
-    # Split text into lines
-    lines = []
-    for i in range(0, len(certificate_text), 70):
-        lines.append(certificate_text[i:i+70])
+    # Split text into lines on word boundaries
+    lines = textwrap.wrap(certificate_text, width=70)
     
     for line in lines:
         text_obj.textLine(line)
@@ -413,22 +518,64 @@ async def generate_certificate(receipt_id: str):
     c.drawString(50, y, f"Signature: {sig}")
     
     # Footer
-    c.setFont("Helvetica-Italic", 10)
+    c.setFont("Helvetica-Oblique", 10)
     c.drawString(50, 50, "This certificate is electronically generated and does not require a physical signature.")
     c.drawString(50, 35, "Verify this certificate at: https://example.com/verify")
     
     c.save()
-    buffer.seek(0)
     
-    return FileResponse(
-        buffer,
+    return buffer.getvalue()
+
+# Rendered certificates by receipt ID, least recently used first
+certificate_cache: "OrderedDict[str, bytes]" = OrderedDict()
+
+async def render_certificate_pdf(receipt_id: str) -> bytes:
+    """Fetch a receipt and render its certificate (cached, receipts are immutable)"""
+    pdf_bytes = certificate_cache.get(receipt_id)
+    if pdf_bytes is not None:
+        certificate_cache.move_to_end(receipt_id)
+        return pdf_bytes
+    
+    # Get the receipt
+    async with db.execute(SQL_GET_RECEIPT, (receipt_id,)) as cursor:
+        result = await cursor.fetchone()
+    
+    if not result:
+        logger.warning(f"Certificate generation failed: Receipt ID={receipt_id} not found")
+        raise HTTPException(status_code=404, detail=f"Receipt with ID {receipt_id} not found")
+    
+    receipt = dict(result)
+    if receipt["metadata"]:
+        receipt["metadata"] = decode_metadata(receipt["metadata"])
+    
+    # ReportLab rendering is CPU-bound, so keep it off the event loop
+    pdf_bytes = await asyncio.to_thread(build_certificate_pdf, receipt)
+    
+    certificate_cache[receipt_id] = pdf_bytes
+    if len(certificate_cache) > CERTIFICATE_CACHE_SIZE:
+        certificate_cache.popitem(last=False)
+    
+    return pdf_bytes
+
+@app.get("/receipts/{receipt_id}/certificate")
+async def generate_certificate(receipt_id: str):
+    """Generate a Section 65B Certificate for a receipt"""
+    pdf_bytes = await render_certificate_pdf(receipt_id)
+    
+    logger.info(f"Section 65B Certificate generated for receipt: ID={receipt_id}")
+    
+    return Response(
+        content=pdf_bytes,
         media_type="application/pdf",
-        filename=f"certificate_{receipt_id}.pdf"
+        headers={"Content-Disposition": content_disposition(f"certificate_{receipt_id}.pdf")}
     )
 
 @app.get("/health")
 async def health_check():
     return {"status": "healthy"}
 
+# ASGI entrypoint: health probes are answered before routing and middleware
+asgi_app = HealthInterceptor(app)
+
 if __name__ == "__main__":
-    uvicorn.run("service:app", host="0.0.0.0", port=6000, reload=True)
\ No newline at end of file
+    uvicorn.run("service:asgi_app", host="0.0.0.0", port=6000, reload=True)
\ No newline at end of file
@@ -1,13 +1,15 @@
 from fastapi import FastAPI, File, UploadFile, HTTPException, BackgroundTasks
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi.responses import JSONResponse, Response
 import uvicorn
+from health_interceptor import HealthInterceptor
 import os
 import hashlib
 import time
-import requests
+import httpx
 import logging
 import uuid
-from typing import Optional
+from typing import BinaryIO, Optional
+from urllib.parse import quote
 from datetime import datetime
 import PyPDF2
 from io import BytesIO
@@ -22,38 +24,58 @@ app = FastAPI(title="PQC PDF Signer", description="Quantum-Safe PDF Signing Serv
 # Configuration
 RECEIPTS_SERVICE_URL = os.environ.get("RECEIPTS_SERVICE_URL", "http://receipts:6000")
 OUTPUT_DIR = os.environ.get("OUTPUT_DIR", "/tmp/signed_pdfs")
+SAVE_SIGNED_PDFS = os.environ.get("SAVE_SIGNED_PDFS", "false").lower() in ("1", "true", "yes")
 
-# Create output directory if it doesn't exist
-os.makedirs(OUTPUT_DIR, exist_ok=True)
+# Create output directory if signed copies are kept on disk
+if SAVE_SIGNED_PDFS:
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+# Shared async HTTP client for talking to the receipts service
+http_client = httpx.AsyncClient(
+    timeout=5.0,
+    limits=httpx.Limits(max_connections=50, max_keepalive_connections=20)
+)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
+
+def content_disposition(filename: str) -> str:
+    """Build an attachment Content-Disposition header safe for any filename"""
+    # Same encoding as FileResponse: RFC 5987 filename* when the name is not plain ASCII
+    quoted_filename = quote(filename)
+    if quoted_filename != filename:
+        return f"attachment; filename*=utf-8''{quoted_filename}"
+    return f'attachment; filename="{filename}"'
 
 # Simulated PQC functions (in production, these would use liboqs)
-def sign_with_dilithium(data: bytes) -> bytes:
-    """Simulate signing data with Dilithium (ML-DSA)"""
+def sign_with_dilithium_digest(digest: bytes) -> bytes:
+    """Simulate signing a precomputed SHA-256 digest with Dilithium (ML-DSA)"""
     # In production: Would use liboqs to generate a Dilithium signature
     # For demo, simulate with a placeholder
-    return f"DILITHIUM-SIGNATURE-{hashlib.sha256(data).hexdigest()[:16]}".encode()
+    return f"DILITHIUM-SIGNATURE-{digest.hex()[:16]}".encode()
+
+def sign_with_dilithium(data: bytes) -> bytes:
+    """Simulate signing data with Dilithium (ML-DSA)"""
+    return sign_with_dilithium_digest(hashlib.sha256(data).digest())
 
 def verify_dilithium_signature(data: bytes, signature: bytes) -> bool:
     """Simulate verifying a Dilithium signature"""
     # In production: Would use liboqs to verify the signature
     # For demo, regenerate the signature and compare
-    expected_sig = f"DILITHIUM-SIGNATURE-{hashlib.sha256(data).hexdigest()[:16]}".encode()
-    return signature == expected_sig
+    return signature == sign_with_dilithium(data)
 
 # PDF signing functions
-def sign_pdf(pdf_data: bytes) -> tuple[bytes, bytes]:
-    """Sign a PDF with Dilithium and return the signed PDF and signature"""
-    # Calculate hash of the PDF
-    pdf_hash = hashlib.sha256(pdf_data).digest()
-    
-    # Generate signature using Dilithium
-    signature = sign_with_dilithium(pdf_data)
+def sign_pdf(pdf_stream: BinaryIO, pdf_digest: bytes) -> tuple[bytes, bytes]:
+    """Sign a PDF stream with Dilithium and return the signed PDF and signature"""
+    # Generate signature over the precomputed hash of the PDF
+    signature = sign_with_dilithium_digest(pdf_digest)
     
     # In a real implementation, we would embed the signature in the PDF
     # For this demo, we'll add a simple annotation with the signature
     try:
-        # Read the PDF
-        pdf_reader = PyPDF2.PdfReader(BytesIO(pdf_data))
+        # Read the PDF directly from the stream
+        pdf_reader = PyPDF2.PdfReader(pdf_stream)
         pdf_writer = PyPDF2.PdfWriter()
         
         # Copy all pages
@@ -93,17 +115,15 @@ def extract_signature_from_pdf(pdf_data: bytes) -> Optional[bytes]:
         logger.error(f"Error extracting signature: {e}")
         return None
 
-def store_receipt(pdf_data: bytes, signature: bytes) -> str:
-    """Store a receipt in the receipts service"""
-    receipt_id = str(uuid.uuid4())
-    
+async def store_receipt(receipt_id: str, pdf_data: bytes, signature: bytes) -> None:
+    """Store a receipt in the receipts service under a pre-assigned ID"""
     try:
         # In production: Make an HTTP request to the receipts service
         # For demo, just log the receipt
         logger.info(f"Storing receipt {receipt_id} for PDF with signature: {signature[:20]}...")
         
         # Attempt to store in receipts service
-        response = requests.post(
+        response = await http_client.post(
             f"{RECEIPTS_SERVICE_URL}/receipts",
             json={
                 "id": receipt_id,
@@ -115,14 +135,10 @@ def store_receipt(pdf_data: bytes, signature: bytes) -> str:
             timeout=5
         )
         
-        if response.status_code == 201:
-            return receipt_id
-        else:
+        if response.status_code != 201:
             logger.warning(f"Failed to store receipt: {response.text}")
-            return receipt_id
     except Exception as e:
         logger.error(f"Error storing receipt: {e}")
-        return receipt_id
 
 # API endpoints
 @app.get("/")
@@ -131,38 +147,42 @@ async def root():
 
 @app.post("/sign")
 async def sign_pdf_endpoint(
-    file: UploadFile = File(...),
-    background_tasks: BackgroundTasks = None
+    background_tasks: BackgroundTasks,
+    file: UploadFile = File(...)
 ):
     """Sign a PDF using Dilithium (ML-DSA)"""
     # Validate file type
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
-    # Read the PDF file
-    pdf_data = await file.read()
+    # Hash the upload in chunks rather than reading it into memory
+    hasher = hashlib.sha256()
+    while chunk := await file.read(1 << 20):
+        hasher.update(chunk)
+    await file.seek(0)
     
-    # Sign the PDF
-    signed_pdf, signature = sign_pdf(pdf_data)
+    # Sign the PDF, letting PyPDF2 read from the spooled upload file
+    signed_pdf, signature = sign_pdf(file.file, hasher.digest())
     
     # Generate output filename
     base_name = os.path.splitext(file.filename)[0]
     output_filename = f"{base_name}-signed.pdf"
-    output_path = os.path.join(OUTPUT_DIR, output_filename)
     
-    # Save the signed PDF
-    with open(output_path, "wb") as f:
-        f.write(signed_pdf)
+    # Optionally keep a copy of the signed PDF on disk
+    if SAVE_SIGNED_PDFS:
+        with open(os.path.join(OUTPUT_DIR, output_filename), "wb") as f:
+            f.write(signed_pdf)
     
-    # Store receipt in background
-    receipt_id = store_receipt(signed_pdf, signature)
+    # Store receipt in background once the response has been sent
+    receipt_id = str(uuid.uuid4())
+    background_tasks.add_task(store_receipt, receipt_id, signed_pdf, signature)
     
-    # Return the signed PDF
-    return FileResponse(
-        path=output_path,
-        filename=output_filename,
+    # Return the signed PDF straight from memory
+    return Response(
+        content=signed_pdf,
         media_type="application/pdf",
         headers={
+            "Content-Disposition": content_disposition(output_filename),
             "X-PQC-Signature": signature.decode(),
             "X-Receipt-ID": receipt_id
         }
@@ -199,5 +219,8 @@ async def verify_pdf_endpoint(file: UploadFile = File(...)):
 async def health_check():
     return {"status": "healthy"}
 
+# ASGI entrypoint: health probes are answered before routing and middleware
+asgi_app = HealthInterceptor(app)
+
 if __name__ == "__main__":
-    uvicorn.run("app:app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file
+    uvicorn.run("app:asgi_app", host="0.0.0.0", port=5000, reload=True)
\ No newline at end of file